@@ -18,6 +18,28 @@ module tb();
     .uo_out(uo_out), .uio_out(uio_out), .uio_oe(uio_oe)
   );
 
+  // Packet streamer: cocotb loads a whole packet (byte 0 in bits [7:0])
+  // into pkt_buf and its byte count into pkt_len with one write each,
+  // then the bytes are clocked onto ui_in here, one per cycle. pkt_buf holds
+  // the longest packet (header, 15 data bytes, parity); keep it in step with
+  // PKT_MAX_BYTES in test.py.
+  reg [8*17-1:0] pkt_buf = 0;
+  reg [4:0] pkt_len = 0;
+  reg pkt_drv = 0;
+
+  always @(posedge clk) begin
+    if (pkt_len != 0) begin
+      ui_in <= pkt_buf[7:0];
+      pkt_buf <= pkt_buf >> 8;
+      pkt_len <= pkt_len - 1;
+      pkt_drv <= 1;
+    end else if (pkt_drv) begin
+      ui_in <= 0;
+      pkt_drv <= 0;
+    end
+  end
+
+`ifndef COCOTB_SIM
   initial begin
     #20 rst_n = 1;
     send_pkt(2, 0);
@@ -43,4 +65,5 @@ module tb();
     ui_in = parity | 8'h01; @(posedge clk);
     ui_in = 0; @(posedge clk);
   endtask
+`endif
 endmodule